@@ -1,3 +1,45 @@
+// libuv's threadpool (fs, dns.lookup, zlib) defaults to 4 threads, which
+// serialises concurrent downloads; it must be sized before first use.
+process.env.UV_THREADPOOL_SIZE = process.env.UV_THREADPOOL_SIZE || '16';
+
+const cluster = require('cluster');
+const WORKERS = parseInt(process.env.WEB_CONCURRENCY) || 1;
+
+// With WEB_CONCURRENCY > 1 the primary only supervises: workers share the
+// listening socket and connections are spread across them. Each worker keeps
+// its own caches and rate-limit counters; one of them owns the file cleanup.
+if (cluster.isPrimary && WORKERS > 1) {
+    let shuttingDown = false;
+    const recentCrashes = [];
+    
+    const forkWorker = runsCleanup => {
+        const worker = cluster.fork({ RUNS_CLEANUP: runsCleanup ? 'true' : 'false' });
+        worker.on('exit', (code, signal) => {
+            if (shuttingDown || worker.exitedAfterDisconnect) return;
+            
+            // Back off when workers keep dying (e.g. failing at boot): the delay
+            // doubles with each crash in the last minute, up to 30 seconds
+            const now = Date.now();
+            while (recentCrashes.length && now - recentCrashes[0] > 60 * 1000) recentCrashes.shift();
+            recentCrashes.push(now);
+            const delay = Math.min(30 * 1000, 1000 * 2 ** (recentCrashes.length - 1));
+            
+            console.error('Worker %d exited (%s), restarting in %dms', worker.process.pid, signal || code, delay);
+            setTimeout(() => {
+                if (!shuttingDown) forkWorker(runsCleanup);
+            }, delay);
+        });
+    };
+    
+    ['SIGTERM', 'SIGINT'].forEach(signal => process.on(signal, () => {
+        shuttingDown = true;
+        cluster.disconnect(() => process.exit(0));
+    }));
+    
+    for (let i = 0; i < WORKERS; i++) forkWorker(i === 0);
+    return;
+}
+
 const express = require('express');
 const cors = require('cors');
 const helmet = require('helmet');
@@ -5,6 +47,38 @@ const rateLimit = require('express-rate-limit');
 const morgan = require('morgan');
 const fs = require('fs');
 const path = require('path');
+const crypto = require('crypto');
+const { pipeline } = require('stream/promises');
+const dns = require('dns');
+const http = require('http');
+const https = require('https');
+
+// getaddrinfo runs on the libuv threadpool for every new connection;
+// remember answers for YouTube and googlevideo hosts for 5 minutes.
+// Any other host is resolved normally on every connection.
+const DNS_CACHE_TTL = 5 * 60 * 1000;
+const DNS_CACHE_SUFFIXES = ['youtube.com', 'youtu.be', 'googlevideo.com', 'ytimg.com'];
+const dnsCache = createTTLCache(256, DNS_CACHE_TTL);
+
+// Shared keep-alive agents so repeated YouTube/googlevideo requests reuse
+// warm TCP/TLS connections instead of handshaking on every call.
+// Installed before YTDownloader is loaded so its HTTP clients pick them up.
+// LIFO scheduling hands out the most recently used (warmest) socket and lets
+// surplus idle ones time out. Set FORCE_IPV4=true to pin connections to IPv4
+// (e.g. behind an IPv4-only proxy); otherwise both families are used.
+const AGENT_OPTIONS = {
+    keepAlive: true,
+    keepAliveMsecs: 30 * 1000,
+    maxSockets: 20, // per host
+    maxFreeSockets: 10,
+    scheduling: 'lifo',
+    timeout: 60 * 1000,
+    lookup: cachedLookup,
+    ...(process.env.FORCE_IPV4 === 'true' && { family: 4 })
+};
+http.globalAgent = new http.Agent(AGENT_OPTIONS);
+https.globalAgent = new https.Agent(AGENT_OPTIONS);
+
 const YT = require('./YTDownloader');
 
 const app = express();
@@ -15,15 +89,47 @@ const API_NAME = "Nãbēēs YouTube API";
 const API_VERSION = "2.0.0";
 const API_AUTHOR = "Nãbēēs";
 const CONTACT = "https://github.com/nabeels";
+// Compiled once; anchored so look-alike hosts never reach YouTube lookups,
+// and the video ID is captured in the same pass
+const YT_URL_REGEX = /^https?:\/\/(?:(?:www|m|music)\.)?(?:youtube\.com\/(?:watch\?(?:[^#]*&)?v=|shorts\/|embed\/|live\/)|youtu\.be\/)([\w-]{11})(?![\w-])/i;
+const YT_ID_REGEX = /^[\w-]{11}$/;
+const UNSAFE_FILENAME_CHARS = /[^\w\s-]/g;
+// process.env reads are slow (each one calls into native code), so settings
+// consulted per request are read once here
+const NODE_ENV = process.env.NODE_ENV || 'development';
+const IS_DEV = process.env.NODE_ENV === 'development';
+const API_KEY_REQUIRED = process.env.API_KEY_REQUIRED === 'true';
+const API_KEY = process.env.API_KEY;
+const RATE_LIMIT_MAX = process.env.RATE_LIMIT_MAX || 100;
+const DOWNLOAD_LIMIT_MAX = process.env.DOWNLOAD_LIMIT_MAX || 10;
 const MAX_FILE_AGE = 3 * 60 * 60 * 1000; // 3 hours for Render's ephemeral storage
+const INFO_CACHE_TTL = 15 * 60 * 1000; // 15 minutes, well inside the lifetime of signed stream URLs
+const INFO_CACHE_MAX = 2048;
+const STATS_CACHE_TTL = 30 * 1000;
+const YT_MAX_CONCURRENCY = parseInt(process.env.YT_MAX_CONCURRENCY) || 2;
+const YT_MIN_INTERVAL = envInt('YT_MIN_INTERVAL_MS', 1000); // 0 disables spacing
+const YT_QUEUE_MAX = 30;
+const YT_QUEUE_MAX_WAIT = 30 * 1000; // roughly when clients give up
+const DOWNLOAD_CONCURRENCY = parseInt(process.env.DOWNLOAD_CONCURRENCY) || 2;
+const DOWNLOAD_QUEUE_MAX = 20;
+const DOWNLOAD_QUEUE_MAX_WAIT = 60 * 1000; // a queued download that starts later only orphans a file
+
+// Single source for the endpoint listing used by / and the 404 handler
+const ENDPOINTS = [
+    { method: 'GET', path: '/api/search', description: 'Search YouTube videos' },
+    { method: 'GET', path: '/api/search/music', description: 'Search music tracks' },
+    { method: 'GET', path: '/api/video/info', description: 'Get video information' },
+    { method: 'POST', path: '/api/download/mp3', description: 'Download as MP3' },
+    { method: 'POST', path: '/api/download/music', description: 'Download music with metadata' },
+    { method: 'GET', path: '/api/download/mp4', description: 'Get MP4 download links' },
+    { method: 'POST', path: '/api/cache/clear', description: 'Clear cached video information (requires API_KEY)' },
+    { method: 'GET', path: '/api/health', description: 'API health check' },
+    { method: 'GET', path: '/api/stats', description: 'API statistics' }
+];
 
 // Ensure directories exist
 const dirs = ['./XeonMedia/audio', './downloads', './temp'];
-dirs.forEach(dir => {
-    if (!fs.existsSync(dir)) {
-        fs.mkdirSync(dir, { recursive: true });
-    }
-});
+dirs.forEach(dir => fs.mkdirSync(dir, { recursive: true })); // no-op when present
 
 // Middleware
 app.use(helmet({
@@ -47,9 +153,13 @@ app.use(express.json({ limit: '10mb' }));
 app.use(express.urlencoded({ extended: true, limit: '10mb' }));
 app.use(morgan('tiny'));
 
-// Static files with cache control
+// Static files with cache control. Download names are unique per request and
+// never rewritten, so clients and proxies can skip revalidation entirely
 app.use('/downloads', express.static('downloads', {
     maxAge: '1h',
+    immutable: true,
+    index: false, // only exact file names are served; skip index.html probes
+    redirect: false,
     setHeaders: (res, path) => {
         res.set('X-Content-Type-Options', 'nosniff');
     }
@@ -57,11 +167,10 @@ app.use('/downloads', express.static('downloads', {
 
 // API Key Middleware (optional)
 const apiKeyMiddleware = (req, res, next) => {
-    if (process.env.API_KEY_REQUIRED === 'true') {
+    if (API_KEY_REQUIRED) {
         const apiKey = req.headers['x-api-key'] || req.query.api_key;
-        const validKey = process.env.API_KEY;
         
-        if (!apiKey || apiKey !== validKey) {
+        if (!apiKey || apiKey !== API_KEY) {
             return res.status(401).json({
                 success: false,
                 message: 'Invalid or missing API key',
@@ -72,10 +181,25 @@ const apiKeyMiddleware = (req, res, next) => {
     next();
 };
 
+// Admin routes always need the key, whatever API_KEY_REQUIRED says, and are
+// disabled entirely when no API_KEY is configured. The key is only taken from
+// the header, since query strings end up in the request log
+const adminKeyMiddleware = (req, res, next) => {
+    const apiKey = req.headers['x-api-key'];
+    
+    if (!API_KEY || apiKey !== API_KEY) {
+        return res.status(401).json({
+            success: false,
+            message: API_KEY ? 'Invalid or missing API key' : 'Admin endpoints are disabled (no API_KEY configured)'
+        });
+    }
+    next();
+};
+
 // Rate limiting per endpoint
 const generalLimiter = rateLimit({
     windowMs: 15 * 60 * 1000,
-    max: process.env.RATE_LIMIT_MAX || 100,
+    max: RATE_LIMIT_MAX,
     message: { success: false, message: 'Too many requests, please try again later.' },
     standardHeaders: true,
     legacyHeaders: false
@@ -83,31 +207,66 @@ const generalLimiter = rateLimit({
 
 const downloadLimiter = rateLimit({
     windowMs: 60 * 60 * 1000,
-    max: process.env.DOWNLOAD_LIMIT_MAX || 10,
+    max: DOWNLOAD_LIMIT_MAX,
     message: { success: false, message: 'Download limit exceeded. Try again later.' }
 });
 
+const adminLimiter = rateLimit({
+    windowMs: 15 * 60 * 1000,
+    max: 10,
+    message: { success: false, message: 'Too many admin requests, please try again later.' }
+});
+
+// Throttle metadata lookups against YouTube to stay clear of bot checks. The
+// spacing is for the whole server and is split across cluster workers; each
+// worker still needs one slot, so concurrent lookups only stay within
+// YT_MAX_CONCURRENCY while WEB_CONCURRENCY does not exceed it.
+const ytLimit = createLimiter(Math.max(1, Math.floor(YT_MAX_CONCURRENCY / WORKERS)), {
+    minInterval: YT_MIN_INTERVAL * WORKERS,
+    maxQueued: YT_QUEUE_MAX,
+    maxWait: YT_QUEUE_MAX_WAIT
+});
+
+// Bound concurrent downloads (network + ffmpeg transcoding) and their backlog
+const downloadLimit = createLimiter(DOWNLOAD_CONCURRENCY, {
+    maxQueued: DOWNLOAD_QUEUE_MAX,
+    maxWait: DOWNLOAD_QUEUE_MAX_WAIT
+});
+
+// Identical searches that arrive together share one backend lookup
+const searchInflight = new Map();
+const musicSearchInflight = new Map();
+
+// Serialized /api/video/info responses keyed by video ID (failures are never cached)
+const videoInfoCache = createTTLCache(INFO_CACHE_MAX, INFO_CACHE_TTL);
+const videoInfoInflight = new Map();
+
+// Serialized /api/download/mp4 responses, keyed by video ID and quality
+const mp4InfoCache = createTTLCache(INFO_CACHE_MAX, INFO_CACHE_TTL);
+const mp4InfoInflight = new Map();
+
+// Directory file counts for /api/stats, refreshed at most every 30 seconds
+const fileCountCache = createTTLCache(8, STATS_CACHE_TTL);
+
+// Last formatted timestamp, reused by isoTimestamp() within the same second
+const timestampCache = { second: 0, iso: '' };
+
 // Routes
+// The root body is static apart from its timestamp, so it is encoded once
+// and the current timestamp is spliced in per request
+const [ROOT_BODY_HEAD, ROOT_BODY_TAIL] = JSON.stringify({
+    api: API_NAME,
+    version: API_VERSION,
+    author: API_AUTHOR,
+    status: 'online',
+    timestamp: '__TIMESTAMP__',
+    endpoints: ENDPOINTS,
+    documentation: 'https://github.com/nabeels/nabeels-youtube-api',
+    note: 'Use responsibly and respect YouTube Terms of Service'
+}).split('"__TIMESTAMP__"');
+
 app.get('/', (req, res) => {
-    res.json({
-        api: API_NAME,
-        version: API_VERSION,
-        author: API_AUTHOR,
-        status: 'online',
-        timestamp: new Date().toISOString(),
-        endpoints: [
-            { method: 'GET', path: '/api/search', description: 'Search YouTube videos' },
-            { method: 'GET', path: '/api/search/music', description: 'Search music tracks' },
-            { method: 'GET', path: '/api/video/info', description: 'Get video information' },
-            { method: 'POST', path: '/api/download/mp3', description: 'Download as MP3' },
-            { method: 'POST', path: '/api/download/music', description: 'Download music with metadata' },
-            { method: 'GET', path: '/api/download/mp4', description: 'Get MP4 download links' },
-            { method: 'GET', path: '/api/health', description: 'API health check' },
-            { method: 'GET', path: '/api/stats', description: 'API statistics' }
-        ],
-        documentation: 'https://github.com/nabeels/nabeels-youtube-api',
-        note: 'Use responsibly and respect YouTube Terms of Service'
-    });
+    res.type('json').send(ROOT_BODY_HEAD + JSON.stringify(isoTimestamp()) + ROOT_BODY_TAIL);
 });
 
 // API Routes with rate limiting
@@ -122,24 +281,28 @@ app.get('/api/search', async (req, res) => {
         const { q, limit = 20, page = 1 } = req.query;
         
         if (!q || q.trim().length < 2) {
-            return res.status(400).json({
-                success: false,
-                message: 'Search query must be at least 2 characters long'
-            });
+            return sendError(res, 400, 'Search query must be at least 2 characters long');
         }
 
-        const results = await YT.search(q, { 
-            limit: Math.min(parseInt(limit), 50),
-            page: parseInt(page)
-        });
+        const maxResults = parseCount(limit, 20, 50);
+        const pageNumber = parseInt(page) || 1;
+        const results = await singleFlight(searchInflight, `${q}|${maxResults}|${pageNumber}`, () =>
+            withRetry(() => ytLimit(() => YT.search(q, { 
+                limit: maxResults,
+                page: pageNumber
+            })))
+        );
+        
+        // Only shape the results we return; the search backend may send more
+        const videos = results.slice(0, maxResults);
 
         res.json({
             success: true,
             query: q,
-            page: parseInt(page),
-            limit: results.length,
+            page: pageNumber,
+            limit: videos.length,
             totalResults: results.length,
-            results: results.map(video => ({
+            results: videos.map(video => ({
                 id: video.videoId,
                 title: video.title,
                 url: `https://youtu.be/${video.videoId}`,
@@ -151,12 +314,7 @@ app.get('/api/search', async (req, res) => {
             }))
         });
     } catch (error) {
-        console.error('Search error:', error);
-        res.status(500).json({
-            success: false,
-            message: 'Search failed',
-            error: process.env.NODE_ENV === 'development' ? error.message : undefined
-        });
+        sendFailure(res, 'Search failed', error);
     }
 });
 
@@ -166,14 +324,13 @@ app.get('/api/search/music', async (req, res) => {
         const { q, limit = 10 } = req.query;
         
         if (!q) {
-            return res.status(400).json({
-                success: false,
-                message: 'Search query is required'
-            });
+            return sendError(res, 400, 'Search query is required');
         }
 
-        const tracks = await YT.searchTrack(q);
-        const limitedTracks = tracks.slice(0, Math.min(parseInt(limit), 20));
+        const tracks = await singleFlight(musicSearchInflight, q, () =>
+            withRetry(() => ytLimit(() => YT.searchTrack(q)))
+        );
+        const limitedTracks = tracks.slice(0, parseCount(limit, 10, 20));
 
         res.json({
             success: true,
@@ -191,12 +348,7 @@ app.get('/api/search/music', async (req, res) => {
             }))
         });
     } catch (error) {
-        console.error('Music search error:', error);
-        res.status(500).json({
-            success: false,
-            message: 'Music search failed',
-            error: process.env.NODE_ENV === 'development' ? error.message : undefined
-        });
+        sendFailure(res, 'Music search failed', error);
     }
 });
 
@@ -204,42 +356,49 @@ app.get('/api/search/music', async (req, res) => {
 app.get('/api/video/info', async (req, res) => {
     try {
         const { url, id } = req.query;
-        const videoId = url || id;
+        const videoRef = url || id;
         
+        if (!videoRef) {
+            return sendError(res, 400, 'YouTube URL or ID is required');
+        }
+
+        // Every URL variant of a video shares one cache entry and lookup
+        const videoId = parseVideoId(videoRef);
         if (!videoId) {
-            return res.status(400).json({
-                success: false,
-                message: 'YouTube URL or ID is required'
-            });
+            return sendError(res, 400, 'Invalid YouTube URL or ID');
         }
 
-        const info = await YT.mp4(videoId);
+        let entry = videoInfoCache.get(videoId);
+        if (!entry) {
+            entry = await singleFlight(videoInfoInflight, videoId, async () => {
+                const info = await withRetry(() => ytLimit(() => YT.mp4(canonicalUrl(videoId))));
+                const description = info.description || '';
+                const fresh = createJSONEntry({
+                    success: true,
+                    video: {
+                        id: videoId,
+                        title: info.title,
+                        description: description.length > 500 ? description.slice(0, 500) + '...' : description,
+                        duration: info.duration,
+                        uploadDate: info.date,
+                        channel: info.channel,
+                        thumbnail: info.thumb.url,
+                        viewCount: info.viewCount || 'Unknown',
+                        formats: [{
+                            quality: info.quality,
+                            contentLength: info.contentLength,
+                            url: info.videoUrl
+                        }]
+                    }
+                });
+                videoInfoCache.set(videoId, fresh);
+                return fresh;
+            });
+        }
         
-        res.json({
-            success: true,
-            video: {
-                id: YT.getVideoID(videoId),
-                title: info.title,
-                description: info.description.substring(0, 500) + '...',
-                duration: info.duration,
-                uploadDate: info.date,
-                channel: info.channel,
-                thumbnail: info.thumb.url,
-                viewCount: info.viewCount || 'Unknown',
-                formats: [{
-                    quality: info.quality,
-                    contentLength: info.contentLength,
-                    url: info.videoUrl
-                }]
-            }
-        });
+        sendJSONEntry(res, entry, INFO_CACHE_TTL);
     } catch (error) {
-        console.error('Video info error:', error);
-        res.status(500).json({
-            success: false,
-            message: 'Failed to get video information',
-            error: process.env.NODE_ENV === 'development' ? error.message : undefined
-        });
+        sendFailure(res, 'Failed to get video information', error);
     }
 });
 
@@ -249,30 +408,26 @@ app.post('/api/download/mp3', async (req, res) => {
         const { url, metadata = {}, autoWriteTags = true } = req.body;
         
         if (!url) {
-            return res.status(400).json({
-                success: false,
-                message: 'YouTube URL is required'
-            });
+            return sendError(res, 400, 'YouTube URL is required');
         }
 
-        if (!YT.isYTUrl(url)) {
-            return res.status(400).json({
-                success: false,
-                message: 'Invalid YouTube URL'
-            });
+        const videoId = parseVideoId(url);
+        if (!videoId) {
+            return sendError(res, 400, 'Invalid YouTube URL');
         }
 
-        console.log(`[${new Date().toISOString()}] MP3 download started: ${url}`);
+        console.log('[%s] MP3 download started: %s', isoTimestamp(), videoId);
         
-        const result = await YT.mp3(url, metadata, autoWriteTags);
+        const result = await downloadLimit(() => YT.mp3(canonicalUrl(videoId), metadata, autoWriteTags));
+        const { meta } = result;
+        const now = Date.now();
         
         // Generate unique filename
-        const videoId = YT.getVideoID(url);
-        const cleanTitle = result.meta.title.replace(/[^\w\s-]/gi, '').substring(0, 100);
-        const filename = `${cleanTitle}_${videoId}_${Date.now()}.mp3`;
+        const filename = mp3Filename(meta.title, videoId, now);
         const newPath = `./downloads/${filename}`;
         
-        fs.renameSync(result.path, newPath);
+        await moveFile(result.path, newPath);
+        scheduleExpiry(newPath, MAX_FILE_AGE);
         
         const downloadUrl = `${req.protocol}://${req.get('host')}/downloads/${filename}`;
         
@@ -281,23 +436,18 @@ app.post('/api/download/mp3', async (req, res) => {
             message: 'MP3 downloaded successfully',
             data: {
                 id: videoId,
-                title: result.meta.title,
-                artist: result.meta.channel,
-                duration: result.meta.seconds,
-                thumbnail: result.meta.image,
+                title: meta.title,
+                artist: meta.channel,
+                duration: meta.seconds,
+                thumbnail: meta.image,
                 downloadUrl: downloadUrl,
                 directLink: downloadUrl,
                 fileSize: formatBytes(result.size),
-                expiresAt: new Date(Date.now() + MAX_FILE_AGE).toISOString()
+                expiresAt: new Date(now + MAX_FILE_AGE).toISOString()
             }
         });
     } catch (error) {
-        console.error('MP3 download error:', error);
-        res.status(500).json({
-            success: false,
-            message: 'MP3 download failed',
-            error: process.env.NODE_ENV === 'development' ? error.message : undefined
-        });
+        sendFailure(res, 'MP3 download failed', error);
     }
 });
 
@@ -307,27 +457,27 @@ app.post('/api/download/music', async (req, res) => {
         const { query, trackId, quality = 'high' } = req.body;
         
         if (!query && !trackId) {
-            return res.status(400).json({
-                success: false,
-                message: 'Query or trackId is required'
-            });
+            return sendError(res, 400, 'Query or trackId is required');
         }
 
-        console.log(`[${new Date().toISOString()}] Music download started: ${query || trackId}`);
+        console.log('[%s] Music download started: %s', isoTimestamp(), query || trackId);
         
         let result;
         if (trackId) {
-            result = await YT.downloadMusic([{ id: trackId }]);
+            result = await downloadLimit(() => YT.downloadMusic([{ id: trackId }]));
         } else {
-            result = await YT.downloadMusic(query);
+            result = await downloadLimit(() => YT.downloadMusic(query));
         }
         
+        const { meta } = result;
+        const now = Date.now();
+        
         // Save to downloads
-        const cleanTitle = result.meta.title.replace(/[^\w\s-]/gi, '').substring(0, 100);
-        const filename = `${cleanTitle}_${result.meta.id}_${Date.now()}.mp3`;
+        const filename = mp3Filename(meta.title, meta.id, now);
         const newPath = `./downloads/${filename}`;
         
-        fs.renameSync(result.path, newPath);
+        await moveFile(result.path, newPath);
+        scheduleExpiry(newPath, MAX_FILE_AGE);
         
         const downloadUrl = `${req.protocol}://${req.get('host')}/downloads/${filename}`;
         
@@ -335,82 +485,103 @@ app.post('/api/download/music', async (req, res) => {
             success: true,
             message: 'Music downloaded with full metadata',
             data: {
-                ...result.meta,
+                ...meta,
                 downloadUrl: downloadUrl,
                 directLink: downloadUrl,
                 fileSize: formatBytes(result.size),
-                expiresAt: new Date(Date.now() + MAX_FILE_AGE).toISOString(),
+                expiresAt: new Date(now + MAX_FILE_AGE).toISOString(),
                 hasMetadata: true,
                 metadata: {
-                    title: result.meta.title,
-                    artist: result.meta.artist,
-                    album: result.meta.album,
-                    year: result.meta.year || new Date().getFullYear(),
-                    coverArt: result.meta.image
+                    title: meta.title,
+                    artist: meta.artist,
+                    album: meta.album,
+                    year: meta.year || new Date().getFullYear(),
+                    coverArt: meta.image
                 }
             }
         });
     } catch (error) {
-        console.error('Music download error:', error);
-        res.status(500).json({
-            success: false,
-            message: 'Music download failed',
-            error: process.env.NODE_ENV === 'development' ? error.message : undefined
-        });
+        sendFailure(res, 'Music download failed', error);
     }
 });
 
+// MP4 quality presets, built once rather than per request
+const MP4_QUALITY_MAP = Object.freeze({
+    'low': 134,
+    'medium': 135,
+    'high': 136,
+    'hd': 137,
+    'best': 'best'
+});
+
+const MP4_QUALITIES = Object.freeze([
+    { id: 134, label: '360p', format: 'mp4' },
+    { id: 135, label: '480p', format: 'mp4' },
+    { id: 136, label: '720p', format: 'mp4' },
+    { id: 137, label: '1080p', format: 'mp4' }
+]);
+
+const DIRECT_LINK_TTL = 6 * 60 * 60 * 1000; // 6 hours
+
 // MP4 download info endpoint
 app.get('/api/download/mp4', async (req, res) => {
     try {
         const { url, quality = 'best' } = req.query;
         
         if (!url) {
-            return res.status(400).json({
-                success: false,
-                message: 'YouTube URL is required'
-            });
+            return sendError(res, 400, 'YouTube URL is required');
         }
 
-        const qualityMap = {
-            'low': 134,
-            'medium': 135,
-            'high': 136,
-            'hd': 137,
-            'best': 'best'
-        };
+        const videoId = parseVideoId(url);
+        if (!videoId) {
+            return sendError(res, 400, 'Invalid YouTube URL');
+        }
 
-        const qualityCode = qualityMap[quality] || quality;
-        const info = await YT.mp4(url, qualityCode);
+        const qualityCode = MP4_QUALITY_MAP[quality] || quality;
+        const cacheKey = `${videoId}:${qualityCode}`;
+        let entry = mp4InfoCache.get(cacheKey);
+        if (!entry) {
+            entry = await singleFlight(mp4InfoInflight, cacheKey, async () => {
+                const info = await withRetry(() => ytLimit(() => YT.mp4(canonicalUrl(videoId), qualityCode)));
+                const fresh = createJSONEntry({
+                    success: true,
+                    data: {
+                        title: info.title,
+                        thumbnail: info.thumb.url,
+                        duration: parseInt(info.duration),
+                        quality: info.quality,
+                        size: formatBytes(parseInt(info.contentLength || 0)),
+                        directLink: info.videoUrl,
+                        expiresAt: new Date(Date.now() + DIRECT_LINK_TTL).toISOString(),
+                        availableQualities: MP4_QUALITIES
+                    }
+                });
+                mp4InfoCache.set(cacheKey, fresh);
+                return fresh;
+            });
+        }
         
-        res.json({
-            success: true,
-            data: {
-                title: info.title,
-                thumbnail: info.thumb.url,
-                duration: parseInt(info.duration),
-                quality: info.quality,
-                size: formatBytes(parseInt(info.contentLength || 0)),
-                directLink: info.videoUrl,
-                expiresAt: new Date(Date.now() + 6 * 60 * 60 * 1000).toISOString(), // 6 hours
-                availableQualities: [
-                    { id: 134, label: '360p', format: 'mp4' },
-                    { id: 135, label: '480p', format: 'mp4' },
-                    { id: 136, label: '720p', format: 'mp4' },
-                    { id: 137, label: '1080p', format: 'mp4' }
-                ]
-            }
-        });
+        sendJSONEntry(res, entry, INFO_CACHE_TTL);
     } catch (error) {
-        console.error('MP4 info error:', error);
-        res.status(500).json({
-            success: false,
-            message: 'Failed to get MP4 information',
-            error: process.env.NODE_ENV === 'development' ? error.message : undefined
-        });
+        sendFailure(res, 'Failed to get MP4 information', error);
     }
 });
 
+// Cache reset endpoint. Caches are per process, so with WEB_CONCURRENCY > 1
+// this only clears the worker that happened to receive the request
+app.post('/api/cache/clear', adminLimiter, adminKeyMiddleware, (req, res) => {
+    const cleared = videoInfoCache.size + mp4InfoCache.size;
+    videoInfoCache.clear();
+    mp4InfoCache.clear();
+    
+    res.json({
+        success: true,
+        message: WORKERS > 1 ? 'Video caches cleared on this worker only' : 'Video caches cleared',
+        scope: WORKERS > 1 ? 'worker' : 'server',
+        cleared: cleared
+    });
+});
+
 // Health check endpoint
 app.get('/api/health', (req, res) => {
     const uptime = process.uptime();
@@ -428,16 +599,18 @@ app.get('/api/health', (req, res) => {
             heapUsed: formatBytes(memoryUsage.heapUsed),
             external: formatBytes(memoryUsage.external)
         },
-        timestamp: new Date().toISOString(),
-        environment: process.env.NODE_ENV || 'development'
+        timestamp: isoTimestamp(),
+        environment: NODE_ENV
     });
 });
 
 // Stats endpoint
-app.get('/api/stats', (req, res) => {
+app.get('/api/stats', async (req, res) => {
     try {
-        const downloadFiles = fs.readdirSync('./downloads').length;
-        const tempFiles = fs.readdirSync('./XeonMedia/audio').length;
+        const [downloadFiles, tempFiles] = await Promise.all([
+            countFiles('./downloads'),
+            countFiles('./XeonMedia/audio')
+        ]);
         
         res.json({
             success: true,
@@ -458,15 +631,12 @@ app.get('/api/stats', (req, res) => {
             },
             limits: {
                 maxFileAge: '3 hours',
-                rateLimit: process.env.RATE_LIMIT_MAX || 100,
-                downloadLimit: process.env.DOWNLOAD_LIMIT_MAX || 10
+                rateLimit: RATE_LIMIT_MAX,
+                downloadLimit: DOWNLOAD_LIMIT_MAX
             }
         });
     } catch (error) {
-        res.status(500).json({
-            success: false,
-            message: 'Failed to get statistics'
-        });
+        sendError(res, 500, 'Failed to get statistics');
     }
 });
 
@@ -479,6 +649,271 @@ function formatBytes(bytes) {
     return parseFloat((bytes / Math.pow(k, i)).toFixed(2)) + ' ' + sizes[i];
 }
 
+// Rename into place; on Render ./downloads is a separate disk mount, so fall
+// back to a streamed copy instead of buffering the file in memory. A failed
+// copy (typically ENOSPC) leaves neither the partial copy nor the source behind.
+async function moveFile(source, destination) {
+    try {
+        await fs.promises.rename(source, destination);
+        return;
+    } catch (error) {
+        if (error.code !== 'EXDEV') throw error;
+    }
+    
+    try {
+        await pipeline(fs.createReadStream(source), fs.createWriteStream(destination));
+    } catch (error) {
+        await Promise.all([
+            fs.promises.unlink(destination).catch(() => {}),
+            fs.promises.unlink(source).catch(() => {})
+        ]);
+        throw error;
+    }
+    await fs.promises.unlink(source);
+}
+
+// Delete a served file as soon as its advertised expiry passes; the periodic
+// sweep remains the backstop for files left over from a restart
+function scheduleExpiry(filePath, delay) {
+    setTimeout(() => {
+        fs.promises.unlink(filePath).then(() => fileCountCache.clear(), err => {
+            if (err.code !== 'ENOENT') console.error('Failed to expire %s:', filePath, err);
+        });
+    }, delay).unref();
+}
+
+async function countFiles(directory) {
+    let count = fileCountCache.get(directory);
+    if (count === undefined) {
+        // Iterate entries instead of materialising the full name list
+        count = 0;
+        for await (const entry of await fs.promises.opendir(directory)) count++;
+        fileCountCache.set(directory, count);
+    }
+    return count;
+}
+
+// Coalesce concurrent calls for the same key onto one in-flight promise
+function singleFlight(inflight, key, fn) {
+    let pending = inflight.get(key);
+    if (!pending) {
+        pending = fn().finally(() => inflight.delete(key));
+        inflight.set(key, pending);
+    }
+    return pending;
+}
+
+// Run at most maxConcurrent tasks at once, starting them minInterval ms apart.
+// Once maxQueued tasks are waiting, new ones are rejected with EQUEUEFULL, as
+// are tasks that would start more than maxWait ms after being queued (their
+// client has most likely given up, so the call would be wasted).
+function createLimiter(maxConcurrent, { minInterval = 0, maxQueued = Infinity, maxWait = Infinity } = {}) {
+    const queue = [];
+    let active = 0;
+    let nextStart = 0;
+    
+    const busyError = message => Object.assign(new Error(message), { code: 'EQUEUEFULL' });
+    
+    const next = () => {
+        if (active >= maxConcurrent || queue.length === 0) return;
+        const { task, resolve, reject, queuedAt } = queue.shift();
+        const now = Date.now();
+        const delay = Math.max(0, nextStart - now);
+        
+        if (now + delay - queuedAt > maxWait) {
+            reject(busyError('Timed out waiting for a free slot'));
+            next();
+            return;
+        }
+        
+        active++;
+        nextStart = Math.max(nextStart, now) + minInterval;
+        
+        setTimeout(() => {
+            Promise.resolve()
+                .then(task)
+                .then(resolve, reject)
+                .finally(() => {
+                    active--;
+                    next();
+                });
+        }, delay);
+    };
+    
+    return task => new Promise((resolve, reject) => {
+        if (queue.length >= maxQueued) {
+            return reject(busyError('Too many queued tasks'));
+        }
+        queue.push({ task, resolve, reject, queuedAt: Date.now() });
+        next();
+    });
+}
+
+// Throttling and network blips are worth retrying; bot checks, private or
+// removed videos are not
+function isTransientError(error) {
+    if (error.code === 'EQUEUEFULL') return false; // our own backpressure, don't queue again
+    const status = error.statusCode || error.status;
+    if (status === 429 || status >= 500) return true;
+    if (['ECONNRESET', 'ETIMEDOUT', 'EAI_AGAIN', 'ECONNREFUSED'].includes(error.code)) return true;
+    
+    const message = String(error.message || '').toLowerCase();
+    if (/sign in|bot|unavailable|private/.test(message)) return false;
+    return /429|rate.?limit|too many requests|timeout|timed out|socket hang up/.test(message);
+}
+
+// Retry transient failures with jittered exponential backoff (1s, 2s, ... up to 30s)
+async function withRetry(task, attempts = 3) {
+    for (let attempt = 1; ; attempt++) {
+        try {
+            return await task();
+        } catch (error) {
+            if (attempt >= attempts || !isTransientError(error)) throw error;
+            const backoff = Math.min(30000, 1000 * 2 ** (attempt - 1));
+            await new Promise(resolve => setTimeout(resolve, backoff / 2 + Math.random() * backoff / 2));
+        }
+    }
+}
+
+// Unique, filesystem-safe name for a finished MP3
+function mp3Filename(title, id, timestamp) {
+    const cleanTitle = title.replace(UNSAFE_FILENAME_CHARS, '').substring(0, 100);
+    return `${cleanTitle}_${id}_${timestamp}.mp3`;
+}
+
+// Uniform error body; the underlying error message is only exposed in development
+function sendError(res, status, message, error) {
+    return res.status(status).json({
+        success: false,
+        message: message,
+        error: IS_DEV && error ? error.message : undefined
+    });
+}
+
+// Error response for a failed backend call. A full or timed-out queue is our
+// own backpressure, so it gets a 503 and no stack trace in the logs
+function sendFailure(res, message, error) {
+    if (error.code === 'EQUEUEFULL') {
+        return sendError(res, 503, 'Server is busy, please try again later');
+    }
+    console.error('%s:', message, error);
+    return sendError(res, 500, message, error);
+}
+
+// Integer environment setting; unlike parseInt(...) || fallback, 0 is honoured
+function envInt(name, fallback) {
+    const value = parseInt(process.env[name]);
+    return Number.isNaN(value) ? fallback : value;
+}
+
+// Positive integer query parameter, falling back on bad input and capped at max
+function parseCount(value, fallback, max) {
+    const parsed = parseInt(value);
+    return Math.min(parsed > 0 ? parsed : fallback, max);
+}
+
+// 11-character video ID from a YouTube URL or bare ID, or null if invalid
+function parseVideoId(value) {
+    if (typeof value !== 'string') return null;
+    if (YT_ID_REGEX.test(value)) return value;
+    const match = YT_URL_REGEX.exec(value);
+    return match ? match[1] : null;
+}
+
+function canonicalUrl(videoId) {
+    return `https://youtu.be/${videoId}`;
+}
+
+// Serialize a response once for caching, along with its validators
+function createJSONEntry(payload) {
+    const body = JSON.stringify(payload);
+    return {
+        body: body,
+        etag: `"${crypto.createHash('blake2b512').update(body).digest('hex').slice(0, 32)}"`,
+        cachedAt: Date.now(),
+        lastModified: new Date().toUTCString()
+    };
+}
+
+// Send a cached entry without re-encoding or re-hashing it; clients may reuse
+// it until the entry expires, and res.send() answers revalidations with a 304
+function sendJSONEntry(res, entry, ttl) {
+    const maxAge = Math.max(0, Math.ceil((entry.cachedAt + ttl - Date.now()) / 1000));
+    res.set({
+        'Cache-Control': `public, max-age=${maxAge}`,
+        'Last-Modified': entry.lastModified,
+        'ETag': entry.etag
+    });
+    res.type('json').send(entry.body);
+}
+
+// ISO timestamp at second resolution, formatted once per second
+function isoTimestamp() {
+    const now = Date.now();
+    const second = now - (now % 1000);
+    if (second !== timestampCache.second) {
+        timestampCache.second = second;
+        timestampCache.iso = new Date(second).toISOString();
+    }
+    return timestampCache.iso;
+}
+
+// Drop-in dns.lookup replacement backed by dnsCache for YouTube hosts
+function cachedLookup(hostname, options, callback) {
+    if (typeof options === 'function') {
+        callback = options;
+        options = {};
+    } else if (typeof options === 'number') {
+        options = { family: options };
+    }
+    
+    const host = hostname.toLowerCase();
+    if (!DNS_CACHE_SUFFIXES.some(suffix => host === suffix || host.endsWith(`.${suffix}`))) {
+        return dns.lookup(hostname, options, callback);
+    }
+    
+    const key = `${host}|${options.family || 0}|${options.hints || 0}|${options.all ? 'all' : 'one'}`;
+    const cached = dnsCache.get(key);
+    if (cached) {
+        process.nextTick(callback, null, ...cached);
+        return;
+    }
+    
+    dns.lookup(hostname, options, (err, address, family) => {
+        if (!err) dnsCache.set(key, [address, family]);
+        callback(err, address, family);
+    });
+}
+
+// Bounded TTL cache; Map iteration order doubles as LRU order
+function createTTLCache(maxEntries, ttl) {
+    const entries = new Map();
+    
+    return {
+        get(key) {
+            const entry = entries.get(key);
+            if (!entry) return undefined;
+            entries.delete(key);
+            if (entry.expires <= Date.now()) return undefined;
+            entries.set(key, entry);
+            return entry.value;
+        },
+        set(key, value) {
+            entries.delete(key);
+            entries.set(key, { value, expires: Date.now() + ttl });
+            if (entries.size > maxEntries) {
+                entries.delete(entries.keys().next().value);
+            }
+        },
+        clear() {
+            entries.clear();
+        },
+        get size() {
+            return entries.size;
+        }
+    };
+}
+
 function formatUptime(seconds) {
     const days = Math.floor(seconds / 86400);
     const hours = Math.floor((seconds % 86400) / 3600);
@@ -501,31 +936,23 @@ app.use((err, req, res, next) => {
         success: false,
         message: 'Internal server error',
         requestId: req.id || Date.now().toString(36),
-        timestamp: new Date().toISOString()
+        timestamp: isoTimestamp()
     });
 });
 
 // 404 handler
+const NOT_FOUND_BODY = JSON.stringify({
+    success: false,
+    message: 'Endpoint not found',
+    availableEndpoints: ['/', ...ENDPOINTS.map(endpoint => endpoint.path)]
+});
+
 app.use('*', (req, res) => {
-    res.status(404).json({
-        success: false,
-        message: 'Endpoint not found',
-        availableEndpoints: [
-            '/',
-            '/api/search',
-            '/api/search/music',
-            '/api/video/info',
-            '/api/download/mp3',
-            '/api/download/music',
-            '/api/download/mp4',
-            '/api/health',
-            '/api/stats'
-        ]
-    });
+    res.status(404).type('json').send(NOT_FOUND_BODY);
 });
 
 // Start server
-app.listen(PORT, () => {
+const server = app.listen(PORT, () => {
     console.log(`
     🚀 ${API_NAME} v${API_VERSION}
     👤 Author: ${API_AUTHOR}
@@ -545,34 +972,57 @@ app.listen(PORT, () => {
     `);
 });
 
+// Keep client connections open longer than the upstream proxy's idle timeout
+// so it never reuses a socket Node has just closed (Node's default is 5s)
+server.keepAliveTimeout = 65 * 1000;
+server.headersTimeout = 66 * 1000;
+
 // File cleanup scheduler (important for Render's ephemeral storage)
-setInterval(() => {
-    cleanupDirectory('./downloads', MAX_FILE_AGE);
-    cleanupDirectory('./XeonMedia/audio', 1 * 60 * 60 * 1000); // 1 hour for temp files
-    console.log(`[${new Date().toISOString()}] Cleanup completed`);
-}, 30 * 60 * 1000); // Run every 30 minutes
-
-function cleanupDirectory(directory, maxAge) {
-    if (!fs.existsSync(directory)) return;
+async function runCleanup() {
+    try {
+        await Promise.all([
+            cleanupDirectory('./downloads', MAX_FILE_AGE),
+            cleanupDirectory('./XeonMedia/audio', 1 * 60 * 60 * 1000) // 1 hour for temp files
+        ]);
+        console.log('[%s] Cleanup completed', isoTimestamp());
+    } catch (err) {
+        console.error('Cleanup failed:', err);
+    }
+}
+
+// Sweep leftovers from a previous run at startup, then every 30 minutes
+if (cluster.isPrimary || process.env.RUNS_CLEANUP === 'true') {
+    runCleanup();
+    setInterval(runCleanup, 30 * 60 * 1000).unref();
+}
+
+async function cleanupDirectory(directory, maxAge) {
+    let files;
+    try {
+        files = await fs.promises.readdir(directory);
+    } catch (err) {
+        if (err.code === 'ENOENT') return;
+        throw err;
+    }
     
     const now = Date.now();
-    const files = fs.readdirSync(directory);
     let cleaned = 0;
     
-    files.forEach(file => {
+    for (const file of files) {
         const filePath = path.join(directory, file);
         try {
-            const stats = fs.statSync(filePath);
+            const stats = await fs.promises.stat(filePath);
             if (now - stats.mtime.getTime() > maxAge) {
-                fs.unlinkSync(filePath);
+                await fs.promises.unlink(filePath);
                 cleaned++;
             }
         } catch (err) {
-            console.error(`Failed to clean up ${filePath}:`, err.message);
+            console.error('Failed to clean up %s:', filePath, err);
         }
-    });
+    }
     
     if (cleaned > 0) {
-        console.log(`Cleaned up ${cleaned} old files from ${directory}`);
+        fileCountCache.clear();
+        console.log('Cleaned up %d old files from %s', cleaned, directory);
     }
 }